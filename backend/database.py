@@ -1,150 +1,316 @@
-"""Simple SQLite database for user and document management."""
+"""Simple SQLite database for user and document management.
 
+Connections run in autocommit mode, so every statement is its own
+transaction (and its own fsync). Code that writes several rows at once must
+group them with ``transaction()`` and ``executemany`` - see
+``create_documents_bulk`` - rather than looping over single-row inserts.
+"""
+
+import atexit
 import sqlite3
 import json
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Sequence, Tuple
 from datetime import datetime
 
+from cachetools import TTLCache, cached
+
 DATABASE_PATH = Path("data/rag_pro.db")
 DATABASE_PATH.parent.mkdir(exist_ok=True)
 
 
+# One connection per thread, kept open for the lifetime of the process
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+# Applied to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+
 def get_db():
-    """Get database connection."""
-    conn = sqlite3.connect(str(DATABASE_PATH))
-    conn.row_factory = sqlite3.Row
+    """Get the database connection for the current thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            str(DATABASE_PATH),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=64  # Comfortably more than the distinct statements below
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
     return conn
 
 
-def init_db():
-    """Initialize database tables."""
-    conn = get_db()
-    cursor = conn.cursor()
+@atexit.register
+def close_db():
+    """Close all open database connections."""
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """Run the enclosed statements in a single transaction."""
+    conn.execute("BEGIN")
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# Short-lived cache of user rows; every authenticated admin request looks one up
+_USER_CACHE = TTLCache(maxsize=10_000, ttl=60)
+_USER_CACHE_LOCK = threading.RLock()
+
+
+# Admin dashboard statistics, recomputed at most every 30 seconds
+_STATS_CACHE = TTLCache(maxsize=1, ttl=30)
+_STATS_CACHE_LOCK = threading.RLock()
+
+
+def _invalidate_stats():
+    with _STATS_CACHE_LOCK:
+        _STATS_CACHE.clear()
 
-    # Users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
+
+# Bump whenever TABLES or the indexes below change; stored in PRAGMA user_version
+SCHEMA_VERSION = 2
+
+# Table definitions; "{name}" lets a table be rebuilt under a temporary name
+TABLES = {
+    "users": """
+        CREATE TABLE IF NOT EXISTS {name} (
             id TEXT PRIMARY KEY,
             username TEXT UNIQUE NOT NULL,
             email TEXT UNIQUE NOT NULL,
             hashed_password TEXT NOT NULL,
             is_admin INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Documents table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS documents (
+        ) WITHOUT ROWID
+    """,
+    "documents": """
+        CREATE TABLE IF NOT EXISTS {name} (
             id TEXT PRIMARY KEY,
             user_id TEXT NOT NULL,
             filename TEXT NOT NULL,
             file_path TEXT NOT NULL,
             chunks INTEGER NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
+            point_ids BLOB,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """,
+}
 
-    conn.commit()
-    conn.close()
+
+def _rebuild_table(cursor, name: str):
+    """Recreate a table from its current definition, keeping its rows."""
+    columns = ", ".join(row["name"] for row in cursor.execute(f"PRAGMA table_info({name})"))
+    cursor.execute(TABLES[name].format(name=f"new_{name}"))
+    cursor.execute(f"INSERT INTO new_{name} ({columns}) SELECT {columns} FROM {name}")
+    cursor.execute(f"DROP TABLE {name}")
+    cursor.execute(f"ALTER TABLE new_{name} RENAME TO {name}")
+
+
+def init_db():
+    """Initialize database tables (no-op if the schema is already current)."""
+    conn = get_db()
+    cursor = conn.cursor()
+
+    if cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        return
+
+    # WAL is persistent, but make sure the database actually switched
+    journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+    if journal_mode.lower() != "wal":
+        raise RuntimeError(f"Could not enable WAL mode (journal_mode={journal_mode})")
+
+    # Rebuilding a table drops the old one, which must not cascade or trip
+    # foreign key checks; the pragma has no effect inside a transaction.
+    cursor.execute("PRAGMA foreign_keys=OFF")
+    try:
+        with transaction(conn):
+            for name, create_sql in TABLES.items():
+                row = cursor.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+                ).fetchone()
+                if row is None:
+                    cursor.execute(create_sql.format(name=name))
+                    continue
+
+                existing_sql = row["sql"].upper()
+                # Tables created before WITHOUT ROWID / ON DELETE CASCADE were introduced
+                if "WITHOUT ROWID" not in existing_sql or (
+                    "REFERENCES" in existing_sql and "ON DELETE CASCADE" not in existing_sql
+                ):
+                    _rebuild_table(cursor, name)
+
+            # Qdrant point IDs were added after the documents table shipped
+            columns = {row["name"] for row in cursor.execute("PRAGMA table_info(documents)")}
+            if "point_ids" not in columns:
+                cursor.execute("ALTER TABLE documents ADD COLUMN point_ids BLOB")
+
+            # Indexes for per-user listings/lookups and the admin "newest first" view
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id, created_at DESC)"
+            )
+            # (created_at, id) is the keyset for paginating get_all_documents
+            cursor.execute("DROP INDEX IF EXISTS idx_documents_created_at")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_created_at_id ON documents(created_at DESC, id DESC)"
+            )
+            # Covering index so get_stats' COUNT/SUM never touch the table pages
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_chunks ON documents(chunks)"
+            )
+
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    finally:
+        cursor.execute("PRAGMA foreign_keys=ON")
 
 
 # User operations
 def create_user(user_id: str, username: str, email: str, hashed_password: str, is_admin: bool = False):
     """Create a new user."""
     conn = get_db()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
+        conn.execute(
             "INSERT INTO users (id, username, email, hashed_password, is_admin) VALUES (?, ?, ?, ?, ?)",
             (user_id, username, email, hashed_password, 1 if is_admin else 0)
         )
-        conn.commit()
+        with _USER_CACHE_LOCK:
+            _USER_CACHE.pop(user_id, None)
+        _invalidate_stats()
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 
 def get_user_by_email(email: str) -> Optional[Dict]:
     """Get user by email."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-    conn.close()
+    row = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
     if row:
         return dict(row)
     return None
 
 
 def get_user_by_id(user_id: str) -> Optional[Dict]:
-    """Get user by ID."""
+    """Get user by ID (cached for up to a minute)."""
+    with _USER_CACHE_LOCK:
+        user = _USER_CACHE.get(user_id)
+    if user is not None:
+        return dict(user)
+
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
     if row:
-        return dict(row)
+        user = dict(row)
+        with _USER_CACHE_LOCK:
+            _USER_CACHE[user_id] = user
+        return dict(user)
     return None
 
 
 # Document operations
-def create_document(doc_id: str, user_id: str, filename: str, file_path: str, chunks: int):
+def _pack_point_ids(point_ids: Optional[Sequence[str]]) -> Optional[bytes]:
+    """Pack Qdrant point IDs (UUIDs) into 16 bytes each."""
+    if point_ids is None:
+        return None
+    return b"".join(uuid.UUID(point_id).bytes for point_id in point_ids)
+
+
+def _unpack_point_ids(blob: Optional[bytes]) -> Optional[List[str]]:
+    """Inverse of _pack_point_ids."""
+    if blob is None:
+        return None
+    return [str(uuid.UUID(bytes=blob[i:i + 16])) for i in range(0, len(blob), 16)]
+
+
+def _document_from_row(row: sqlite3.Row) -> Dict:
+    doc = dict(row)
+    doc["point_ids"] = _unpack_point_ids(doc.get("point_ids"))
+    return doc
+
+
+def create_document(
+    doc_id: str,
+    user_id: str,
+    filename: str,
+    file_path: str,
+    chunks: int,
+    point_ids: Optional[Sequence[str]] = None
+):
     """Create a document record."""
+    create_documents_bulk([(doc_id, user_id, filename, file_path, chunks, point_ids)])
+
+
+def create_documents_bulk(rows: Sequence[Tuple[str, str, str, str, int, Optional[Sequence[str]]]]):
+    """Create several document records in one transaction.
+
+    Each row is ``(doc_id, user_id, filename, file_path, chunks, point_ids)``.
+    """
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO documents (id, user_id, filename, file_path, chunks) VALUES (?, ?, ?, ?, ?)",
-        (doc_id, user_id, filename, file_path, chunks)
-    )
-    conn.commit()
-    conn.close()
+    with transaction(conn):
+        conn.executemany(
+            "INSERT INTO documents (id, user_id, filename, file_path, chunks, point_ids) VALUES (?, ?, ?, ?, ?, ?)",
+            [(*row[:5], _pack_point_ids(row[5])) for row in rows]
+        )
+    _invalidate_stats()
 
 
 def get_user_documents(user_id: str) -> List[Dict]:
     """Get all documents for a user."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
+    rows = conn.execute(
         "SELECT id, filename, chunks, created_at FROM documents WHERE user_id = ? ORDER BY created_at DESC",
         (user_id,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    ).fetchall()
     return [dict(row) for row in rows]
 
 
 def get_document(doc_id: str, user_id: str) -> Optional[Dict]:
     """Get a specific document (with ownership check)."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
+    row = conn.execute(
         "SELECT * FROM documents WHERE id = ? AND user_id = ?",
         (doc_id, user_id)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    ).fetchone()
     if row:
-        return dict(row)
+        return _document_from_row(row)
     return None
 
 
 def delete_document(doc_id: str, user_id: str) -> bool:
     """Delete a document (with ownership check)."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
+    cursor = conn.execute(
         "DELETE FROM documents WHERE id = ? AND user_id = ?",
         (doc_id, user_id)
     )
     deleted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    _invalidate_stats()
     return deleted
 
 
@@ -152,82 +318,90 @@ def delete_document(doc_id: str, user_id: str) -> bool:
 def get_all_users() -> List[Dict]:
     """Get all users (admin only)."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
+    rows = conn.execute(
         "SELECT id, username, email, is_admin, created_at FROM users ORDER BY created_at DESC"
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    ).fetchall()
     return [dict(row) for row in rows]
 
 
-def get_all_documents() -> List[Dict]:
-    """Get all documents across all users (admin only)."""
+def get_all_documents(limit: int = 50, before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Get a page of documents across all users, newest first (admin only).
+
+    ``before`` is the ``next_cursor`` returned for the previous page. Returns
+    the documents and the cursor for the following page (None on the last one).
+    """
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
+    query = """
         SELECT d.id, d.filename, d.chunks, d.created_at, d.user_id, u.username, u.email
         FROM documents d
         JOIN users u ON d.user_id = u.id
-        ORDER BY d.created_at DESC
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    """
+    params: list = []
+    if before is not None:
+        created_at, separator, doc_id = before.partition("|")
+        if not separator:
+            raise ValueError("Invalid cursor")
+        query += " WHERE (d.created_at, d.id) < (?, ?)"
+        params += [created_at, doc_id]
+    query += " ORDER BY d.created_at DESC, d.id DESC LIMIT ?"
+    # Fetch one extra row to know whether there is a next page
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    documents = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = documents[-1]
+        next_cursor = f"{last['created_at']}|{last['id']}"
+    return documents, next_cursor
+
+
+def get_document_admin(doc_id: str) -> Optional[Dict]:
+    """Get any document (admin only, no ownership check)."""
+    conn = get_db()
+    row = conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    if row:
+        return _document_from_row(row)
+    return None
 
 
 def delete_user_admin(user_id: str) -> bool:
     """Delete a user and all their documents (admin only)."""
     conn = get_db()
-    cursor = conn.cursor()
-    try:
-        # Delete user's documents first
-        cursor.execute("DELETE FROM documents WHERE user_id = ?", (user_id,))
-        # Delete user
-        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        return deleted
-    finally:
-        conn.close()
+    # Documents are removed by ON DELETE CASCADE in the same statement
+    cursor = conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    deleted = cursor.rowcount > 0
+    with _USER_CACHE_LOCK:
+        _USER_CACHE.pop(user_id, None)
+    _invalidate_stats()
+    return deleted
 
 
 def delete_document_admin(doc_id: str) -> bool:
     """Delete any document (admin only, no ownership check)."""
     conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+    cursor = conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
     deleted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    _invalidate_stats()
     return deleted
 
 
+@cached(_STATS_CACHE, lock=_STATS_CACHE_LOCK)
 def get_stats() -> Dict:
     """Get system statistics (admin only)."""
     conn = get_db()
-    cursor = conn.cursor()
-
-    # Total users
-    cursor.execute("SELECT COUNT(*) as count FROM users")
-    total_users = cursor.fetchone()['count']
 
-    # Total documents
-    cursor.execute("SELECT COUNT(*) as count FROM documents")
-    total_documents = cursor.fetchone()['count']
-
-    # Total chunks
-    cursor.execute("SELECT SUM(chunks) as total FROM documents")
-    total_chunks = cursor.fetchone()['total'] or 0
-
-    conn.close()
+    # Users, documents and chunks in one round-trip (one pass over documents)
+    total_users, total_documents, total_chunks = conn.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM users),
+            COUNT(*),
+            COALESCE(SUM(chunks), 0)
+        FROM documents
+    """).fetchone()
 
     return {
         "total_users": total_users,
         "total_documents": total_documents,
         "total_chunks": total_chunks
     }
-
-
-# Initialize database on module import
-init_db()
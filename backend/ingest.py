@@ -0,0 +1,87 @@
+"""Document ingestion (Docling extraction + chunking).
+
+Runs inside the ingestion process pool, so this module must stay free of the
+API's heavyweight state (embedding models, Qdrant client, database).
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import xxhash
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from docling.document_converter import DocumentConverter
+
+CHUNK_SIZE = 1500
+
+# Text splitter - Improved chunking strategy
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,  # Larger chunks for better context
+    chunk_overlap=300,  # More overlap to preserve context across chunks
+    length_function=len,
+    separators=["\n\n", "\n", " ", ""]
+)
+
+# Docling converter, created once per worker process by init_worker()
+doc_converter: Optional[DocumentConverter] = None
+
+
+def init_worker(num_threads: int = 0):
+    """Load Docling in a freshly started worker process.
+
+    ``num_threads`` caps the OpenMP/MKL and PyTorch threads of the worker so
+    parallel workers don't oversubscribe the cores; 0 keeps the defaults.
+    """
+    global doc_converter
+    if num_threads:
+        # Read by Docling's accelerator options when the converter is created
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[name] = str(num_threads)
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+    doc_converter = DocumentConverter()
+
+
+def extract_text_with_docling(file_path: str) -> str:
+    """Extract text from document using Docling."""
+    if doc_converter is None:
+        init_worker()
+    try:
+        result = doc_converter.convert(file_path)
+        # One export for the whole document: exporting page by page walks
+        # the full item tree once per page
+        return result.document.export_to_markdown()
+    except Exception as e:
+        raise Exception(f"Docling processing failed: {str(e)}")
+
+
+def extract_and_chunk(
+    file_path: str,
+    user_id: str,
+    doc_id: str,
+    filename: str
+) -> Tuple[List[str], List[Dict]]:
+    """Extract a document's text and split it into chunks with metadata."""
+    chunks = text_splitter.split_text(extract_text_with_docling(file_path))
+
+    # Drop repeated chunks (headers, footers, boilerplate slides) so each
+    # distinct text is embedded and stored only once per document
+    unique_chunks = []
+    metadatas = []
+    seen_hashes = set()
+    for i, chunk in enumerate(chunks):
+        content_hash = xxhash.xxh3_64_hexdigest(chunk.strip().lower().encode())
+        if content_hash in seen_hashes:
+            continue
+        seen_hashes.add(content_hash)
+        unique_chunks.append(chunk)
+        # Add metadata with user_id for isolation
+        metadatas.append({
+            "user_id": user_id,
+            "doc_id": doc_id,
+            "filename": filename,
+            "chunk_id": i,
+            "content_hash": content_hash
+        })
+
+    return unique_chunks, metadatas
@@ -1,22 +1,49 @@
 import os
+import json
 import uuid
-from typing import List, Optional
+import asyncio
+import functools
+import base64
+import multiprocessing
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 from pathlib import Path
 from datetime import timedelta
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+import aiofiles
+import numpy as np
+from cachetools import TTLCache
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import Ollama
-from langchain_community.vectorstores import Qdrant
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Distance,
+    VectorParams,
+    Filter,
+    FieldCondition,
+    MatchValue,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    FilterSelector,
+    Range,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    QuantizationSearchParams
+)
 
-from docling.document_converter import DocumentConverter
-from sentence_transformers import CrossEncoder
+import ingest
+from onnx_models import FastEmbeddings, OnnxCrossEncoder
 
 # Import auth and database modules
 from auth import (
@@ -38,9 +65,10 @@ from database import (
     get_all_users,
     get_all_documents,
     delete_user_admin,
+    get_document_admin,
     delete_document_admin,
     get_stats,
-    get_db
+    init_db
 )
 
 # Initialize FastAPI
@@ -65,17 +93,41 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 QDRANT_PATH = Path("data/qdrant")
 QDRANT_PATH.mkdir(parents=True, exist_ok=True)
+# Optional Qdrant server; by default the embedded local storage above is used
+QDRANT_URL = os.getenv("QDRANT_URL")
 
 COLLECTION_NAME = "documents"
-
-# Initialize embeddings
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'}
+QUERY_CACHE_COLLECTION_NAME = "query_cache"
+
+# Initialize embeddings (int8 ONNX export of all-MiniLM-L6-v2)
+embeddings = FastEmbeddings(
+    model_id="sentence-transformers/all-MiniLM-L6-v2",
+    batch_size=64,
+    max_length=256,  # Chunks are ~1500 chars; longer token tails only waste FLOPs
+    # Model replicas embedding an upload's batches in parallel
+    num_workers=int(os.getenv("EMBEDDING_WORKERS", "2"))
 )
 
+# Chunks embedded per step of the upload pipeline (one batch per replica)
+INDEX_BATCH_SIZE = embeddings.batch_size * embeddings.num_workers
+
 # Initialize Qdrant (PERSISTENT storage)
-qdrant_client = QdrantClient(path=str(QDRANT_PATH))
+if QDRANT_URL:
+    qdrant_client = QdrantClient(url=QDRANT_URL)
+else:
+    qdrant_client = QdrantClient(path=str(QDRANT_PATH))
+
+# Embedded Qdrant isn't thread-safe (collections are plain numpy arrays and
+# lists, updated without a lock), so after startup every Qdrant call goes
+# through run_qdrant() and runs on this single thread
+qdrant_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qdrant")
+
+
+async def run_qdrant(func, *args, **kwargs):
+    """Run a blocking Qdrant call on the Qdrant thread."""
+    return await asyncio.get_running_loop().run_in_executor(
+        qdrant_executor, functools.partial(func, *args, **kwargs)
+    )
 
 # Create collection if it doesn't exist
 try:
@@ -83,15 +135,49 @@ try:
 except:
     qdrant_client.create_collection(
         collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE, on_disk=False),
+        # int8 copies of the vectors (~4x smaller) are searched first; the
+        # original float32 vectors are only used to rescore the candidates
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        ),
+        # A Qdrant server then reads payloads (chunk text, reranker token IDs)
+        # from disk instead of RAM; embedded local mode ignores this and
+        # always keeps every payload in memory
+        on_disk_payload=bool(QDRANT_URL),
     )
 
-# Initialize vector store
-vector_store = Qdrant(
-    client=qdrant_client,
-    collection_name=COLLECTION_NAME,
-    embeddings=embeddings,
+# Index the user_id payload so filtered searches only visit the user's points,
+# and doc_id for deleting a document's points by filter. Only a Qdrant server
+# has payload indexes; embedded local mode ignores them (with a warning) and
+# evaluates filters by scanning every payload.
+if QDRANT_URL:
+    for field_name in ("metadata.user_id", "metadata.doc_id"):
+        qdrant_client.create_payload_index(
+            collection_name=COLLECTION_NAME,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+
+# Semantic response cache: answers keyed by query embedding, so near-identical
+# questions skip rerank and generation. Entries are tied to the in-memory
+# per-user document versions below, so the collection starts empty each run.
+QUERY_CACHE_THRESHOLD = 0.97
+QUERY_CACHE_TTL = 3600  # seconds
+qdrant_client.recreate_collection(
+    collection_name=QUERY_CACHE_COLLECTION_NAME,
+    vectors_config=VectorParams(size=384, distance=Distance.COSINE),
 )
+if QDRANT_URL:
+    qdrant_client.create_payload_index(
+        collection_name=QUERY_CACHE_COLLECTION_NAME,
+        field_name="user_id",
+        field_schema=PayloadSchemaType.KEYWORD
+    )
 
 # Initialize LLM (use environment variable for model selection)
 # Use environment variable for Ollama URL (for Docker compatibility)
@@ -99,19 +185,56 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
 llm = Ollama(model=OLLAMA_MODEL, base_url=OLLAMA_BASE_URL)
 
-# Text splitter - Improved chunking strategy
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1500,  # Larger chunks for better context
-    chunk_overlap=300,  # More overlap to preserve context across chunks
-    length_function=len,
-    separators=["\n\n", "\n", " ", ""]
+# Initialize reranking model (cross-encoder for better relevance scoring)
+# Exported to ONNX and quantized to int8 on first start. Both MiniLM models
+# use the same uncased BERT vocabulary, so the embedder's tokenizer (which also
+# truncates at 256 tokens) is shared instead of loading a second one
+reranker = OnnxCrossEncoder(
+    'cross-encoder/ms-marco-MiniLM-L-6-v2',
+    tokenizer=embeddings.tokenizer
+)
+
+# Docling extraction and chunking run in separate processes so CPU-heavy
+# conversions don't block the event loop. Workers are spawned (not forked) so
+# they only import the ingest module, not this one. That holds only while this
+# module isn't the __main__ script (spawned children re-run __main__), so the
+# app is started with the uvicorn CLI and has no __main__ entry point.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Each worker gets an equal share of the cores for Docling's models, instead
+# of every worker starting one OpenMP/PyTorch thread per core
+INGEST_THREADS = max(1, (os.cpu_count() or 1) // INGEST_WORKERS)
+ingest_pool = ProcessPoolExecutor(
+    max_workers=INGEST_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+    initializer=ingest.init_worker,
+    initargs=(INGEST_THREADS,)
 )
 
-# Initialize reranking model (cross-encoder for better relevance scoring)
-reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+# Chat response cache: repeated questions skip retrieval, rerank and generation.
+# Keys include a per-user version that is bumped whenever the user's documents
+# change, so answers computed against an older document set are never served.
+chat_cache = TTLCache(maxsize=1024, ttl=300)
+chat_cache_lock = threading.Lock()
+user_doc_versions: Dict[str, int] = defaultdict(int)
+
 
-# Initialize Docling converter
-doc_converter = DocumentConverter()
+def user_doc_version(user_id: str) -> int:
+    """Get the version of a user's document set."""
+    with chat_cache_lock:
+        return user_doc_versions[user_id]
+
+
+def chat_cache_key(user_id: str, query: str) -> bytes:
+    """Build the chat cache key for a user's query."""
+    version = user_doc_version(user_id)
+    normalized_query = query.strip().lower()
+    return hashlib.blake2b(f"{user_id}|{version}|{normalized_query}".encode()).digest()
+
+
+def invalidate_chat_cache(user_id: str):
+    """Invalidate cached chat responses for a user."""
+    with chat_cache_lock:
+        user_doc_versions[user_id] += 1
 
 
 # Pydantic models
@@ -149,14 +272,143 @@ class DocumentInfo(BaseModel):
     created_at: str
 
 
-def extract_text_with_docling(file_path: str) -> str:
-    """Extract text from document using Docling."""
+# Qdrant user_id filters are immutable, so build each user's only once
+user_filters: Dict[str, Filter] = {}
+
+
+def get_user_filter(user_id: str) -> Filter:
+    """Get the Qdrant filter restricting a search to a user's documents."""
+    user_filter = user_filters.get(user_id)
+    if user_filter is None:
+        user_filter = user_filters.setdefault(
+            user_id,
+            Filter(
+                must=[
+                    FieldCondition(
+                        key="metadata.user_id",
+                        match=MatchValue(value=user_id)
+                    )
+                ]
+            )
+        )
+    return user_filter
+
+
+def delete_document_vectors(doc: dict):
+    """Delete a document's chunks from Qdrant.
+
+    Uses the stored point IDs; documents saved before those were recorded are
+    deleted by filtering on their doc_id.
+    """
+    if doc.get("point_ids"):
+        points_selector = PointIdsList(points=doc["point_ids"])
+    else:
+        points_selector = FilterSelector(
+            filter=Filter(
+                must=[FieldCondition(key="metadata.doc_id", match=MatchValue(value=doc["id"]))]
+            )
+        )
+    qdrant_client.delete(collection_name=COLLECTION_NAME, points_selector=points_selector)
+
+
+def delete_user_vectors(user_id: str):
+    """Delete all of a user's chunks from Qdrant."""
+    qdrant_client.delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=FilterSelector(filter=get_user_filter(user_id))
+    )
+
+
+def pack_token_ids(ids: Sequence[int]) -> str:
+    """Encode token IDs for a Qdrant payload as base64 of 2-byte integers.
+
+    A payload list of Python ints costs ~30 bytes per token in local Qdrant;
+    the BERT vocabulary (30522 tokens) fits in uint16.
+    """
+    return base64.b64encode(np.asarray(ids, dtype=np.uint16).tobytes()).decode("ascii")
+
+
+def unpack_token_ids(packed: str) -> np.ndarray:
+    """Decode token IDs stored by pack_token_ids()."""
+    return np.frombuffer(base64.b64decode(packed), dtype=np.uint16)
+
+
+def tokenize_for_rerank(chunks: List[str]) -> List[str]:
+    """Reranker token IDs of chunks, packed for the payload."""
+    return [pack_token_ids(ids) for ids in reranker.tokenize_passages(chunks)]
+
+
+async def index_chunks(chunks: List[str], metadatas: List[dict], point_ids: List[str]):
+    """Embed chunks and upsert them into Qdrant under the given point IDs.
+
+    Embedding and upserting are pipelined through a bounded queue: the next
+    group of chunks is embedded while the previous one is written to Qdrant.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+
+    async def embed():
+        for start in range(0, len(chunks), INDEX_BATCH_SIZE):
+            vectors = await asyncio.to_thread(
+                embeddings.embed_documents, chunks[start:start + INDEX_BATCH_SIZE]
+            )
+            await queue.put((start, vectors))
+        await queue.put(None)
+
+    async def upsert():
+        while (item := await queue.get()) is not None:
+            start, vectors = item
+            # Chunks never change, so tokenize them for the reranker once here
+            # instead of on every query that retrieves them
+            rerank_ids = await asyncio.to_thread(
+                tokenize_for_rerank, chunks[start:start + len(vectors)]
+            )
+            points = [
+                PointStruct(
+                    id=point_ids[start + i],
+                    vector=vector,
+                    # Same payload layout as LangChain's Qdrant wrapper used before
+                    payload={
+                        "page_content": chunks[start + i],
+                        "metadata": metadatas[start + i],
+                        "rerank_ids": rerank_ids[i]
+                    }
+                )
+                for i, vector in enumerate(vectors)
+            ]
+            await run_qdrant(qdrant_client.upsert, collection_name=COLLECTION_NAME, points=points)
+
+    tasks = [asyncio.ensure_future(embed()), asyncio.ensure_future(upsert())]
     try:
-        result = doc_converter.convert(file_path)
-        text = result.document.export_to_markdown()
-        return text
-    except Exception as e:
-        raise Exception(f"Docling processing failed: {str(e)}")
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # gather() doesn't cancel the other stage, which would then wait on
+        # the queue forever
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+@app.on_event("startup")
+def startup_init_db():
+    """Create or migrate the database schema once per process."""
+    init_db()
+
+
+@app.on_event("startup")
+async def start_semantic_cache_pruning():
+    """Start the background task that expires semantic cache entries."""
+    # Keep a reference so the task isn't garbage collected
+    app.state.semantic_cache_pruner = asyncio.create_task(prune_semantic_cache())
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Stop the ingestion worker processes, embedding and Qdrant threads."""
+    ingest_pool.shutdown(wait=False, cancel_futures=True)
+    embeddings.close()
+    # Let queued Qdrant writes finish
+    qdrant_executor.shutdown(wait=True)
 
 
 @app.get("/")
@@ -239,6 +491,7 @@ async def upload_document(
     user_id: str = Depends(get_current_user_id)
 ):
     """Upload and process a document (user-specific)."""
+    point_ids: List[str] = []
     try:
         # Validate file type
         supported_extensions = ('.pdf', '.docx', '.pptx', '.xlsx', '.html', '.png', '.jpg', '.jpeg', '.tiff')
@@ -256,35 +509,31 @@ async def upload_document(
         user_upload_dir.mkdir(exist_ok=True)
         file_path = user_upload_dir / f"{doc_id}_{file.filename}"
 
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Extract text using Docling
-        text = extract_text_with_docling(str(file_path))
+        # Stream to disk in 1 MB pieces instead of buffering the whole upload
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(1 << 20):
+                await f.write(chunk)
+
+        # Extract text using Docling and split into chunks (in the ingest pool)
+        chunks, metadatas = await asyncio.get_running_loop().run_in_executor(
+            ingest_pool,
+            ingest.extract_and_chunk,
+            str(file_path),
+            user_id,
+            doc_id,
+            file.filename
+        )
 
-        if not text.strip():
+        if not chunks:
             raise HTTPException(status_code=400, detail="No text could be extracted from the document")
 
-        # Split into chunks
-        chunks = text_splitter.split_text(text)
-
-        # Add metadata with user_id for isolation
-        metadatas = [
-            {
-                "user_id": user_id,
-                "doc_id": doc_id,
-                "filename": file.filename,
-                "chunk_id": i
-            }
-            for i in range(len(chunks))
-        ]
-
-        # Add to vector store
-        vector_store.add_texts(chunks, metadatas=metadatas)
+        # Embed and index the chunks
+        point_ids = [uuid.uuid4().hex for _ in chunks]
+        await index_chunks(chunks, metadatas, point_ids)
 
-        # Save to database
-        db_create_document(doc_id, user_id, file.filename, str(file_path), len(chunks))
+        # Save to database (with point IDs so the vectors can be deleted later)
+        db_create_document(doc_id, user_id, file.filename, str(file_path), len(chunks), point_ids)
+        invalidate_chat_cache(user_id)
 
         return {
             "message": "Document uploaded and processed successfully",
@@ -294,68 +543,179 @@ async def upload_document(
         }
 
     except Exception as e:
+        # Points indexed before the failure have no documents row to delete
+        # them through later
+        if point_ids:
+            await run_qdrant(
+                qdrant_client.delete,
+                collection_name=COLLECTION_NAME,
+                points_selector=PointIdsList(points=point_ids)
+            )
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(
-    request: ChatRequest,
-    user_id: str = Depends(get_current_user_id)
-):
-    """Chat with the documents (only user's own documents)."""
-    try:
-        if not request.query.strip():
-            raise HTTPException(status_code=400, detail="Query cannot be empty")
+def semantic_cache_filter(user_id: str, version: int) -> Filter:
+    """Match a user's cache entries that are current and not expired."""
+    return Filter(
+        must=[
+            FieldCondition(key="user_id", match=MatchValue(value=user_id)),
+            FieldCondition(key="version", match=MatchValue(value=version)),
+            FieldCondition(key="created_at", range=Range(gte=time.time() - QUERY_CACHE_TTL))
+        ]
+    )
 
-        # Step 1: Retrieve documents with user_id filter
-        # Note: Qdrant filter to only search user's documents
-        from qdrant_client.models import Filter, FieldCondition, MatchValue
 
-        user_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="metadata.user_id",
-                    match=MatchValue(value=user_id)
-                )
-            ]
-        )
+def lookup_semantic_cache(
+    user_id: str,
+    version: int,
+    query_vector: List[float]
+) -> Optional[ChatResponse]:
+    """Find a cached answer to a near-identical earlier query."""
+    hits = qdrant_client.search(
+        collection_name=QUERY_CACHE_COLLECTION_NAME,
+        query_vector=query_vector,
+        query_filter=semantic_cache_filter(user_id, version),
+        limit=1,
+        score_threshold=QUERY_CACHE_THRESHOLD,
+        with_payload=True
+    )
+    if not hits:
+        return None
+    return ChatResponse(response=hits[0].payload["response"], sources=hits[0].payload["sources"])
+
+
+def store_semantic_cache(user_id: str, version: int, query_vector: List[float], chat_response: ChatResponse):
+    """Cache an answer under its query embedding."""
+    qdrant_client.upsert(
+        collection_name=QUERY_CACHE_COLLECTION_NAME,
+        points=[
+            PointStruct(
+                id=uuid.uuid4().hex,
+                vector=query_vector,
+                payload={
+                    "user_id": user_id,
+                    "version": version,
+                    "created_at": time.time(),
+                    "response": chat_response.response,
+                    "sources": chat_response.sources
+                }
+            )
+        ]
+    )
+
 
-        # Search with filter
-        initial_docs = vector_store.similarity_search(
-            request.query,
-            k=12,
-            filter=user_filter
+async def prune_semantic_cache():
+    """Periodically drop expired semantic cache entries."""
+    while True:
+        await asyncio.sleep(QUERY_CACHE_TTL / 4)
+        expired = Filter(
+            must=[FieldCondition(key="created_at", range=Range(lt=time.time() - QUERY_CACHE_TTL))]
+        )
+        await run_qdrant(
+            qdrant_client.delete,
+            collection_name=QUERY_CACHE_COLLECTION_NAME,
+            points_selector=FilterSelector(filter=expired)
         )
 
-        if not initial_docs:
-            return ChatResponse(
-                response="I couldn't find any relevant information in your uploaded documents. Please upload documents first.",
-                sources=[]
-            )
 
-        # Step 2: Rerank documents
-        pairs = [[request.query, doc.page_content] for doc in initial_docs]
-        scores = reranker.predict(pairs)
+# Two-stage retrieval: a wide, cheap HNSW search, then the cross-encoder on
+# at most RERANK_CANDIDATES of those, keeping the best RERANK_TOP_K
+RETRIEVAL_CANDIDATES = 50
+RERANK_CANDIDATES = 16
+RERANK_SCORE_RATIO = 0.85  # Drop candidates scoring below 85% of the best match
+RERANK_TOP_K = 5
+
+NO_DOCUMENTS_RESPONSE = "I couldn't find any relevant information in your uploaded documents. Please upload documents first."
+
 
-        doc_score_pairs = list(zip(initial_docs, scores))
-        doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
-        reranked_docs = [doc for doc, score in doc_score_pairs[:5]]
+def rerank(query: str, docs: List[dict]) -> np.ndarray:
+    """Cross-encoder scores of the query against retrieved chunk payloads."""
+    passage_ids = [
+        unpack_token_ids(doc["rerank_ids"]) if "rerank_ids" in doc else None
+        for doc in docs
+    ]
+    # Chunks indexed before token IDs were stored are tokenized on the fly
+    missing = [i for i, ids in enumerate(passage_ids) if ids is None]
+    if missing:
+        tokenized = reranker.tokenize_passages([docs[i]["page_content"] for i in missing])
+        for i, ids in zip(missing, tokenized):
+            passage_ids[i] = ids
+    return reranker.predict_tokenized(query, passage_ids)
+
+
+async def build_chat_prompt(
+    query: str,
+    query_vector: List[float],
+    user_id: str
+) -> Tuple[Optional[str], List[str]]:
+    """Retrieve and rerank the user's chunks for an (already embedded) query.
+
+    Returns the LLM prompt and the source filenames, or (None, []) when the
+    user has no relevant documents.
+    """
+    # Step 1: Retrieve documents with user_id filter
+    # Note: Qdrant filter to only search user's documents
+    user_filter = get_user_filter(user_id)
+
+    # Search with filter (directly against Qdrant, on the Qdrant thread)
+    hits = await run_qdrant(
+        qdrant_client.search,
+        collection_name=COLLECTION_NAME,
+        query_vector=query_vector,
+        query_filter=user_filter,
+        limit=RETRIEVAL_CANDIDATES,
+        search_params=SearchParams(
+            hnsw_ef=128,
+            quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+        ),
+        with_payload=True
+    )
+
+    if not hits:
+        return None, []
+
+    # Keep only candidates close to the best vector match; each distinct text
+    # once (the same chunk may appear in several documents)
+    min_score = hits[0].score * RERANK_SCORE_RATIO if hits[0].score > 0 else float("-inf")
+    initial_docs = []
+    seen_hashes = set()
+    for hit in hits:
+        if hit.score < min_score or len(initial_docs) == RERANK_CANDIDATES:
+            break
+        content_hash = hit.payload["metadata"].get("content_hash")
+        if content_hash is not None:
+            if content_hash in seen_hashes:
+                continue
+            seen_hashes.add(content_hash)
+        initial_docs.append(hit.payload)
+
+    # Step 2: Rerank documents
+    # Score all candidates in a single forward pass, in a worker thread
+    scores = await asyncio.to_thread(rerank, query, initial_docs)
+
+    # Select the top RERANK_TOP_K in O(n), then order just those by score
+    if len(scores) > RERANK_TOP_K:
+        top = np.argpartition(-scores, RERANK_TOP_K)[:RERANK_TOP_K]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top])]
+    reranked_docs = [initial_docs[i] for i in top]
 
-        # Step 3: Build enhanced context
-        context_parts = []
-        for i, doc in enumerate(reranked_docs, 1):
-            filename = doc.metadata.get("filename", "Unknown")
-            context_parts.append(f"[Source {i}: {filename}]\n{doc.page_content}")
+    # Step 3: Build enhanced context
+    context_parts = []
+    for i, doc in enumerate(reranked_docs, 1):
+        filename = doc["metadata"].get("filename", "Unknown")
+        context_parts.append(f"[Source {i}: {filename}]\n{doc['page_content']}")
 
-        context = "\n\n---\n\n".join(context_parts)
+    context = "\n\n---\n\n".join(context_parts)
 
-        # Step 4: Enhanced prompt with chain-of-thought
-        prompt = f"""You are a helpful assistant analyzing documents to answer questions accurately.
+    # Step 4: Enhanced prompt with chain-of-thought
+    prompt = f"""You are a helpful assistant analyzing documents to answer questions accurately.
 
 Context from relevant documents:
 {context}
 
-Question: {request.query}
+Question: {query}
 
 Instructions:
 1. First, identify which parts of the context are relevant to the question
@@ -366,18 +726,120 @@ Instructions:
 
 Answer:"""
 
-        # Generate response
-        response = llm.invoke(prompt)
+    # Extract unique sources
+    sources = list(set([doc["metadata"].get("filename", "Unknown") for doc in reranked_docs]))
 
-        # Extract unique sources
-        sources = list(set([doc.metadata.get("filename", "Unknown") for doc in reranked_docs]))
+    return prompt, sources
 
-        return ChatResponse(response=response, sources=sources)
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Chat with the documents (only user's own documents)."""
+    try:
+        if not request.query.strip():
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+        cache_key = chat_cache_key(user_id, request.query)
+        with chat_cache_lock:
+            cached_response = chat_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        # Embed the query and read the document version once; both are
+        # reused for the semantic cache lookup, retrieval and the cache write
+        version = user_doc_version(user_id)
+        query_vector = await asyncio.to_thread(embeddings.embed_query, request.query)
+        cached_response = await run_qdrant(lookup_semantic_cache, user_id, version, query_vector)
+        if cached_response is not None:
+            return cached_response
+
+        prompt, sources = await build_chat_prompt(request.query, query_vector, user_id)
+        if prompt is None:
+            return ChatResponse(response=NO_DOCUMENTS_RESPONSE, sources=[])
+
+        # Generate response (awaited, so concurrent chats overlap)
+        response = await llm.ainvoke(prompt)
+
+        chat_response = ChatResponse(response=response, sources=sources)
+        with chat_cache_lock:
+            chat_cache[cache_key] = chat_response
+        await run_qdrant(store_semantic_cache, user_id, version, query_vector, chat_response)
+
+        return chat_response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
 
+def sse_event(data: dict) -> str:
+    """Format a server-sent event carrying a JSON payload."""
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Chat with the documents, streaming the answer as server-sent events.
+
+    Emits ``{"token": ...}`` events as the answer is generated, followed by a
+    final ``{"sources": [...], "done": true}`` event.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    cache_key = chat_cache_key(user_id, request.query)
+    with chat_cache_lock:
+        cached_response = chat_cache.get(cache_key)
+
+    # Retrieval and rerank happen before the stream starts, so their errors
+    # are still reported as a normal HTTP error
+    prompt, sources = None, []
+    version = user_doc_version(user_id)
+    query_vector = None
+    if cached_response is None:
+        try:
+            query_vector = await asyncio.to_thread(embeddings.embed_query, request.query)
+            cached_response = await run_qdrant(lookup_semantic_cache, user_id, version, query_vector)
+            if cached_response is None:
+                prompt, sources = await build_chat_prompt(request.query, query_vector, user_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+
+    async def token_iter():
+        if cached_response is not None:
+            yield sse_event({"token": cached_response.response})
+            yield sse_event({"sources": cached_response.sources, "done": True})
+            return
+
+        if prompt is None:
+            yield sse_event({"token": NO_DOCUMENTS_RESPONSE})
+            yield sse_event({"sources": [], "done": True})
+            return
+
+        tokens = []
+        try:
+            async for token in llm.astream(prompt):
+                tokens.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"error": f"Error processing chat: {str(e)}", "done": True})
+            return
+
+        yield sse_event({"sources": sources, "done": True})
+
+        chat_response = ChatResponse(response="".join(tokens), sources=sources)
+        with chat_cache_lock:
+            chat_cache[cache_key] = chat_response
+        await run_qdrant(store_semantic_cache, user_id, version, query_vector, chat_response)
+
+    return StreamingResponse(token_iter(), media_type="text/event-stream")
+
+
 @app.get("/documents", response_model=List[DocumentInfo])
 async def list_documents(user_id: str = Depends(get_current_user_id)):
     """List all documents for the current user."""
@@ -410,13 +872,13 @@ async def delete_document(
         if file_path.exists():
             file_path.unlink()
 
-        # Delete from vector store (filter by user_id and doc_id)
-        # Note: This is a limitation - Qdrant doesn't have easy metadata-based deletion
-        # In production, you'd track point IDs or use a different approach
+        # Delete from vector store
+        await run_qdrant(delete_document_vectors, doc)
 
         # Delete from database
         if not db_delete_document(doc_id, user_id):
             raise HTTPException(status_code=404, detail="Could not delete document")
+        invalidate_chat_cache(user_id)
 
         return {"message": "Document deleted successfully"}
 
@@ -442,10 +904,17 @@ async def get_admin_users(admin_id: str = Depends(get_current_admin_user_id)):
 
 
 @app.get("/admin/documents")
-async def get_admin_documents(admin_id: str = Depends(get_current_admin_user_id)):
-    """Get all documents (admin only)."""
-    documents = get_all_documents()
-    return {"documents": documents}
+async def get_admin_documents(
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = None,
+    admin_id: str = Depends(get_current_admin_user_id)
+):
+    """Get a page of all documents, newest first (admin only)."""
+    try:
+        documents, next_cursor = get_all_documents(limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return {"documents": documents, "next_cursor": next_cursor}
 
 
 @app.delete("/admin/users/{user_id}")
@@ -468,8 +937,13 @@ async def delete_user(
         import shutil
         shutil.rmtree(user_upload_dir)
 
+    # Delete from vector store
+    await run_qdrant(delete_user_vectors, user_id)
+
     # Delete from database (will cascade delete documents)
     if delete_user_admin(user_id):
+        invalidate_chat_cache(user_id)
+        user_filters.pop(user_id, None)
         return {"message": f"User {user['username']} deleted successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to delete user")
@@ -482,29 +956,23 @@ async def delete_document_as_admin(
 ):
     """Delete any document (admin only)."""
     # Get document info before deleting
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
-    doc = cursor.fetchone()
-    conn.close()
+    doc = get_document_admin(doc_id)
 
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    doc_dict = dict(doc)
-
     # Delete file
-    file_path = Path(doc_dict["file_path"])
+    file_path = Path(doc["file_path"])
     if file_path.exists():
         file_path.unlink()
 
+    # Delete from vector store
+    await run_qdrant(delete_document_vectors, doc)
+
     # Delete from database
     if delete_document_admin(doc_id):
+        invalidate_chat_cache(doc["user_id"])
         return {"message": "Document deleted successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to delete document")
 
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
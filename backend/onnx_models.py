@@ -0,0 +1,312 @@
+"""ONNX Runtime (int8) versions of the models used by the RAG pipeline."""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.transformers.optimizer import optimize_model
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTModelForSequenceClassification
+from tokenizers import Encoding, Tokenizer
+from transformers import AutoTokenizer
+
+# Exported and quantized models are cached here so the export only runs once
+MODEL_DIR = Path("data/models")
+
+OPTIMIZED_MODEL_FILE = "model_optimized.onnx"
+QUANTIZED_MODEL_FILE = "model_optimized_quantized.onnx"
+
+
+def export_quantized(model_id: str, ort_model_class) -> Path:
+    """Export a Hugging Face model to ONNX, fuse it and quantize it to int8.
+
+    Returns the directory holding the tokenizer and the quantized model.
+    """
+    export_dir = MODEL_DIR / model_id.replace("/", "--")
+    exported_path = export_dir / "model.onnx"
+    optimized_path = export_dir / OPTIMIZED_MODEL_FILE
+    quantized_path = export_dir / QUANTIZED_MODEL_FILE
+
+    if not quantized_path.exists():
+        if not exported_path.exists():
+            model = ort_model_class.from_pretrained(model_id, export=True)
+            model.save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(export_dir)
+        # Fuse attention, SkipLayerNorm and BiasGelu into single ops before
+        # quantizing; once MatMuls are quantized these patterns no longer match
+        optimize_model(str(exported_path), model_type="bert", opt_level=0).save_model_to_file(
+            str(optimized_path)
+        )
+        # Dynamic quantization: int8 weights, activations quantized at runtime.
+        # Shape inference can't type the outputs of the fused (com.microsoft)
+        # ops, so untyped tensors are treated as float32
+        quantize_dynamic(
+            str(optimized_path),
+            str(quantized_path),
+            weight_type=QuantType.QInt8,
+            extra_options={"DefaultTensorType": onnx.TensorProto.FLOAT}
+        )
+
+    return export_dir
+
+
+def create_session(model_dir: Path, intra_op_num_threads: int = 0) -> ort.InferenceSession:
+    """Create a CPU inference session for a quantized model.
+
+    ``intra_op_num_threads=0`` lets ONNX Runtime use one thread per core.
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = 1
+    # Several sessions share the cores (embedder replicas, reranker); idle
+    # workers busy-waiting for the next run would steal CPU from the others
+    options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    # Enable all graph fusions (attention, GELU, LayerNorm, ...)
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        str(model_dir / QUANTIZED_MODEL_FILE),
+        sess_options=options,
+        providers=["CPUExecutionProvider"]
+    )
+
+
+def load_tokenizer(model_dir: Path, max_length: int) -> Tokenizer:
+    """Load the (Rust) tokenizer of an exported model.
+
+    Truncation and padding are configured once here and never changed
+    afterwards, so the tokenizer can be shared between models and threads.
+    """
+    tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+    tokenizer.enable_truncation(max_length)
+    tokenizer.enable_padding(pad_id=tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+    return tokenizer
+
+
+def encodings_to_features(encodings: Sequence[Encoding]) -> Dict[str, np.ndarray]:
+    """Stack padded encodings into BERT input arrays."""
+    return {
+        "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+        "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+        "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+    }
+
+
+class BoundSession:
+    """Runs a session through IOBinding, reusing one output buffer.
+
+    Not thread-safe: callers must hold the session exclusively while running
+    it and reading the result, which is a view into the output buffer and is
+    overwritten by the next run(). The buffer only grows, so its size is
+    bounded by the largest batch seen.
+    """
+
+    def __init__(self, session: ort.InferenceSession):
+        self.session = session
+        self.input_names = [model_input.name for model_input in session.get_inputs()]
+        self.output_name = session.get_outputs()[0].name
+        self.io_binding = session.io_binding()
+        self.output_buffer = np.empty(0, dtype=np.float32)
+
+    def run(self, features: Dict[str, np.ndarray], output_shape: Tuple[int, ...]) -> np.ndarray:
+        self.io_binding.clear_binding_inputs()
+        self.io_binding.clear_binding_outputs()
+        for name in self.input_names:
+            # Freshly built and contiguous, so bound without a copy
+            self.io_binding.bind_cpu_input(name, features[name])
+
+        size = int(np.prod(output_shape))
+        if self.output_buffer.size < size:
+            self.output_buffer = np.empty(size, dtype=np.float32)
+        output = self.output_buffer[:size].reshape(output_shape)
+        self.io_binding.bind_output(
+            self.output_name, "cpu", 0, np.float32, list(output_shape), output.ctypes.data
+        )
+        self.session.run_with_iobinding(self.io_binding)
+        return output
+
+
+class OnnxCrossEncoder:
+    """Int8 ONNX replacement for sentence_transformers.CrossEncoder.
+
+    predict() keeps the CrossEncoder call signature but returns raw logits
+    (no sigmoid), which rank candidates in the same order.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_length: int = 512,
+        tokenizer: Optional[Tokenizer] = None
+    ):
+        model_dir = export_quantized(model_id, ORTModelForSequenceClassification)
+        # A shared tokenizer brings its own truncation length
+        self.tokenizer = tokenizer or load_tokenizer(model_dir, max_length)
+        self.max_length = self.tokenizer.truncation["max_length"]
+        self.session = BoundSession(create_session(model_dir))
+        # Concurrent chats share the one session (and its output buffer)
+        self.session_lock = threading.Lock()
+        self.cls_id = self.tokenizer.token_to_id("[CLS]")
+        self.sep_id = self.tokenizer.token_to_id("[SEP]")
+        self.pad_id = self.tokenizer.padding["pad_id"]
+
+    def predict(
+        self,
+        pairs: Sequence[Sequence[str]],
+        batch_size: Optional[int] = None,
+        convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        """Score (query, passage) pairs.
+
+        By default all pairs go through a single forward pass.
+        """
+        batch_size = batch_size or max(len(pairs), 1)
+        scores: List[np.ndarray] = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = encodings_to_features(
+                self.tokenizer.encode_batch([(query, passage) for query, passage in batch])
+            )
+            with self.session_lock:
+                logits = self.session.run(features, (len(batch), 1))
+                scores.append(logits[:, 0].copy())
+
+        return np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+
+    def tokenize_passages(self, passages: List[str], max_tokens: int = 240) -> List[List[int]]:
+        """Token IDs of passages without special tokens, for predict_tokenized().
+
+        ``max_tokens`` leaves room for the query within ``max_length``.
+        """
+        encodings = self.tokenizer.encode_batch(passages, add_special_tokens=False)
+        return [
+            encoding.ids[:min(sum(encoding.attention_mask), max_tokens)]
+            for encoding in encodings
+        ]
+
+    def predict_tokenized(self, query: str, passage_ids: Sequence[Sequence[int]]) -> np.ndarray:
+        """Score one query against pre-tokenized passages in a single pass.
+
+        Only the query is tokenized; each input is assembled as
+        ``[CLS] query [SEP] passage [SEP]``, truncating the passage to fit.
+        """
+        if not passage_ids:
+            return np.empty(0, dtype=np.float32)
+        query_ids = self.tokenizer.encode(query, add_special_tokens=False).ids
+        query_ids = query_ids[:self.max_length // 2]
+        passage_budget = self.max_length - len(query_ids) - 3
+        passage_ids = [ids[:passage_budget] for ids in passage_ids]
+
+        batch = len(passage_ids)
+        seq_len = len(query_ids) + 3 + max(len(ids) for ids in passage_ids)
+        input_ids = np.full((batch, seq_len), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((batch, seq_len), dtype=np.int64)
+        token_type_ids = np.zeros((batch, seq_len), dtype=np.int64)
+
+        prefix = [self.cls_id, *query_ids, self.sep_id]
+        input_ids[:, :len(prefix)] = prefix
+        for row, ids in enumerate(passage_ids):
+            end = len(prefix) + len(ids) + 1
+            input_ids[row, len(prefix):end - 1] = ids
+            input_ids[row, end - 1] = self.sep_id
+            attention_mask[row, :end] = 1
+            token_type_ids[row, len(prefix):end] = 1
+
+        features = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+        }
+        with self.session_lock:
+            return self.session.run(features, (batch, 1))[:, 0].copy()
+
+
+class FastEmbeddings(Embeddings):
+    """Int8 ONNX sentence embeddings (mean pooled, L2 normalized) for LangChain.
+
+    With ``num_workers > 1`` the model is loaded that many times, each replica
+    with an equal share of the cores, and embed_documents() runs batches on
+    the replicas in parallel.
+    """
+
+    def __init__(
+        self,
+        model_id: str = "sentence-transformers/all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        max_length: int = 256,
+        num_workers: int = 1
+    ):
+        model_dir = export_quantized(model_id, ORTModelForFeatureExtraction)
+        self.tokenizer = load_tokenizer(model_dir, max_length)
+
+        threads_per_replica = max(1, (os.cpu_count() or 1) // num_workers) if num_workers > 1 else 0
+        self.sessions: "queue.Queue[BoundSession]" = queue.Queue()
+        for _ in range(num_workers):
+            session = create_session(model_dir, intra_op_num_threads=threads_per_replica)
+            self.sessions.put(BoundSession(session))
+        self.executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+
+        self.hidden_size = session.get_outputs()[0].shape[-1]
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.num_workers = num_workers
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        features = encodings_to_features(self.tokenizer.encode_batch(texts))
+        batch, seq_len = features["input_ids"].shape
+        session = self.sessions.get()
+        try:
+            token_embeddings = session.run(features, (batch, seq_len, self.hidden_size))
+
+            # Mean pooling over real (non-padding) tokens; token_embeddings
+            # is a view into the replica's reusable output buffer
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+        finally:
+            self.sessions.put(session)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in padded batches of ``batch_size``."""
+        batches = [
+            texts[start:start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if not batches:
+            return []
+        if self.executor is not None and len(batches) > 1:
+            # ONNX Runtime releases the GIL, so replicas run concurrently
+            vectors = list(self.executor.map(self._embed_batch, batches))
+        else:
+            vectors = [self._embed_batch(batch) for batch in batches]
+        return np.concatenate(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query.
+
+        A lone text needs no padding, so every token is pooled without
+        building or applying an attention mask.
+        """
+        features = encodings_to_features([self.tokenizer.encode(text)])
+        seq_len = features["input_ids"].shape[1]
+        session = self.sessions.get()
+        try:
+            token_embeddings = session.run(features, (1, seq_len, self.hidden_size))
+            pooled = token_embeddings[0].mean(axis=0)
+        finally:
+            self.sessions.put(session)
+
+        return (pooled / max(float(np.linalg.norm(pooled)), 1e-12)).tolist()
+
+    def close(self):
+        """Stop the worker threads."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
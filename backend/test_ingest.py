@@ -0,0 +1,14 @@
+import ingest
+
+
+def test_extract_and_chunk_skips_duplicate_chunks(monkeypatch):
+    boilerplate = "Confidential " * 100
+    body = ["Introduction " * 100, "Results " * 100]
+    text = "\n\n".join([boilerplate, body[0], boilerplate.upper(), body[1]])
+    monkeypatch.setattr(ingest, "extract_text_with_docling", lambda file_path: text)
+
+    chunks, metadatas = ingest.extract_and_chunk("report.pdf", "user", "doc", "report.pdf")
+
+    assert chunks == [boilerplate.strip(), body[0].strip(), body[1].strip()]
+    assert [metadata["chunk_id"] for metadata in metadatas] == [0, 1, 3]
+    assert {metadata["doc_id"] for metadata in metadatas} == {"doc"}
@@ -5,7 +5,8 @@ export async function GET(request: NextRequest) {
   try {
     const authorization = request.headers.get('authorization');
 
-    const response = await fetch(`${BACKEND_URL}/admin/documents`, {
+    // Forward pagination parameters (limit, before)
+    const response = await fetch(`${BACKEND_URL}/admin/documents${request.nextUrl.search}`, {
       method: 'GET',
       headers: {
         'Authorization': authorization || '',
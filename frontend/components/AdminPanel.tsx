@@ -35,6 +35,8 @@ export function AdminPanel() {
   const [stats, setStats] = useState<Stats | null>(null)
   const [users, setUsers] = useState<User[]>([])
   const [documents, setDocuments] = useState<Document[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(true)
   const [activeTab, setActiveTab] = useState<"stats" | "users" | "documents">("stats")
   const [error, setError] = useState("")
@@ -60,11 +62,12 @@ export function AdminPanel() {
       })
       setUsers(usersRes.data.users)
 
-      // Load documents
+      // Load the first page of documents
       const docsRes = await axios.get(`/api/admin/documents`, {
         headers: getAuthHeaders(),
       })
       setDocuments(docsRes.data.documents)
+      setNextCursor(docsRes.data.next_cursor)
     } catch (err: any) {
       if (err.response?.status === 403) {
         setError("Admin access required")
@@ -78,6 +81,31 @@ export function AdminPanel() {
     }
   }
 
+  const loadMoreDocuments = async () => {
+    if (!nextCursor) {
+      return
+    }
+
+    try {
+      setLoadingMore(true)
+      const docsRes = await axios.get(`/api/admin/documents`, {
+        params: { before: nextCursor },
+        headers: getAuthHeaders(),
+      })
+      setDocuments((prev) => [...prev, ...docsRes.data.documents])
+      setNextCursor(docsRes.data.next_cursor)
+    } catch (err: any) {
+      if (err.response?.status === 401 || err.response?.status === 403) {
+        alert("Authentication failed. Please refresh the page to login again.")
+        window.location.reload()
+      } else {
+        alert(err.response?.data?.detail || "Failed to load more documents")
+      }
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const deleteUser = async (userId: string, username: string) => {
     if (!confirm(`Are you sure you want to delete user "${username}" and all their documents?`)) {
       return
@@ -172,7 +200,7 @@ export function AdminPanel() {
             variant={activeTab === "documents" ? "default" : "outline"}
           >
             <FileText className="h-4 w-4 mr-2" />
-            Documents ({documents.length})
+            Documents ({stats?.total_documents ?? documents.length})
           </Button>
         </div>
 
@@ -294,6 +322,13 @@ export function AdminPanel() {
                   </div>
                 ))}
               </div>
+              {nextCursor && (
+                <div className="flex justify-center mt-6">
+                  <Button variant="outline" onClick={loadMoreDocuments} disabled={loadingMore}>
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </Button>
+                </div>
+              )}
             </CardContent>
           </Card>
         )}